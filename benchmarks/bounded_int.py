@@ -0,0 +1,56 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Conversion and validation times on bounded integer parameters over growing ranges.
+
+    python benchmarks/bounded_int.py --sizes 100 1000 10000 100000 --plan-length 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import unified_planning as up
+from up_tamer.engine import EngineImpl
+from problems import slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--plan-length', type=int, default=1000)
+    args = parser.parse_args()
+    up.shortcuts.get_environment().credits_stream = None
+    print(f"{'range':>8} {'problem (s)':>12} {'plan (s)':>9} {'validation (s)':>15} {'status':>8}")
+    for size in args.sizes:
+        problem, plan = slots(size, min(size, args.plan_length))
+        engine = EngineImpl()
+        start = time.perf_counter()
+        tproblem, _ = engine._convert_problem(problem)
+        problem_time = time.perf_counter() - start
+        start = time.perf_counter()
+        engine._convert_plan(tproblem, plan)
+        plan_time = time.perf_counter() - start
+        start = time.perf_counter()
+        result = engine.validate(problem, plan)
+        validation_time = time.perf_counter() - start
+        print(f'{size:8d} {problem_time:12.3f} {plan_time:9.3f} {validation_time:15.3f} {result.status.name:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Conversion and validation times of growing sequential and time-triggered plans.
+
+    python benchmarks/plan_conversion.py --lengths 1000 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import unified_planning as up
+from up_tamer.engine import EngineImpl
+from problems import schedule, slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lengths', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--machines', type=int, default=8)
+    args = parser.parse_args()
+    up.shortcuts.get_environment().credits_stream = None
+    print(f"{'plan':>15} {'steps':>7} {'conversion (s)':>15} {'us/step':>8} {'validation (s)':>15} {'status':>8}")
+    for length in args.lengths:
+        for kind, (problem, plan) in [('sequential', slots(length, length)),
+                                      ('time-triggered', schedule(args.machines, length))]:
+            engine = EngineImpl()
+            tproblem, _ = engine._convert_problem(problem)
+            start = time.perf_counter()
+            engine._convert_plan(tproblem, plan)
+            conversion_time = time.perf_counter() - start
+            start = time.perf_counter()
+            result = engine.validate(problem, plan)
+            validation_time = time.perf_counter() - start
+            print(f'{kind:>15} {length:7d} {conversion_time:15.3f} {1e6 * conversion_time / length:8.2f} '
+                  f'{validation_time:15.3f} {result.status.name:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Scalable problems used by the benchmarks."""
+
+from unified_planning.shortcuts import *
+from unified_planning.plans import ActionInstance, SequentialPlan, TimeTriggeredPlan
+from fractions import Fraction
+from typing import Tuple
+
+
+def gripper(balls: int, rooms: int = 3) -> 'Problem':
+    """A robot with one gripper moving `balls` balls from the first room to the others."""
+    Room = UserType('Room')
+    Ball = UserType('Ball')
+    at = Fluent('at', BoolType(), b=Ball, r=Room)
+    robot_at = Fluent('robot_at', BoolType(), r=Room)
+    holding = Fluent('holding', BoolType(), b=Ball)
+    free = Fluent('free', BoolType())
+
+    move = InstantaneousAction('move', a=Room, b=Room)
+    move.add_precondition(robot_at(move.a))
+    move.add_precondition(Not(Equals(move.a, move.b)))
+    move.add_effect(robot_at(move.a), False)
+    move.add_effect(robot_at(move.b), True)
+    pick = InstantaneousAction('pick', b=Ball, r=Room)
+    pick.add_precondition(robot_at(pick.r))
+    pick.add_precondition(at(pick.b, pick.r))
+    pick.add_precondition(free())
+    pick.add_effect(at(pick.b, pick.r), False)
+    pick.add_effect(holding(pick.b), True)
+    pick.add_effect(free(), False)
+    drop = InstantaneousAction('drop', b=Ball, r=Room)
+    drop.add_precondition(robot_at(drop.r))
+    drop.add_precondition(holding(drop.b))
+    drop.add_effect(at(drop.b, drop.r), True)
+    drop.add_effect(holding(drop.b), False)
+    drop.add_effect(free(), True)
+
+    problem = Problem(f'gripper_{balls}')
+    for f in [at, robot_at, holding, free]:
+        problem.add_fluent(f, default_initial_value=False)
+    problem.add_actions([move, pick, drop])
+    room_objects = [Object(f'room{i}', Room) for i in range(rooms)]
+    ball_objects = [Object(f'ball{i}', Ball) for i in range(balls)]
+    problem.add_objects(room_objects + ball_objects)
+    problem.set_initial_value(robot_at(room_objects[0]), True)
+    problem.set_initial_value(free(), True)
+    for i, b in enumerate(ball_objects):
+        problem.set_initial_value(at(b, room_objects[0]), True)
+        problem.add_goal(at(b, room_objects[1 + i % (rooms - 1)]))
+    return problem
+
+
+def slots(size: int, taken: int) -> Tuple['Problem', 'SequentialPlan']:
+    """
+    Resource slots indexed by a bounded integer range of `size` values, with
+    a plan taking the first `taken` slots.
+    """
+    Slot = IntType(0, size - 1)
+    used = Fluent('used', BoolType(), s=Slot)
+    capacity = Fluent('capacity', IntType(0, 10), s=Slot)
+    count = Fluent('count', IntType(0, size))
+
+    take = InstantaneousAction('take', s=Slot, large=BoolType())
+    take.add_precondition(Not(used(take.s)))
+    take.add_precondition(Implies(take.large, GE(capacity(take.s), 5)))
+    take.add_effect(used(take.s), True)
+    take.add_increase_effect(count, 1)
+
+    problem = Problem(f'slots_{size}')
+    problem.add_fluent(used, default_initial_value=False)
+    problem.add_fluent(capacity, default_initial_value=1)
+    problem.add_fluent(count, default_initial_value=0)
+    problem.add_action(take)
+    for i in range(0, size, 3):
+        problem.set_initial_value(capacity(i), 7)
+    problem.add_goal(GE(count, taken))
+    plan = SequentialPlan([ActionInstance(take, (Int(i), Bool(i % 3 == 0))) for i in range(taken)])
+    return problem, plan
+
+
+def schedule(machines: int, steps: int) -> Tuple['Problem', 'TimeTriggeredPlan']:
+    """
+    Machines running jobs of alternating durations, with a time-triggered
+    plan of `steps` jobs spread round-robin over the machines.
+    """
+    Machine = UserType('Machine')
+    busy = Fluent('busy', BoolType(), m=Machine)
+    done = Fluent('done', IntType(0, steps), m=Machine)
+
+    run = DurativeAction('run', m=Machine)
+    run.set_closed_duration_interval(1, 2)
+    run.add_condition(StartTiming(), Not(busy(run.m)))
+    run.add_effect(StartTiming(), busy(run.m), True)
+    run.add_effect(EndTiming(), busy(run.m), False)
+    run.add_increase_effect(EndTiming(), done(run.m), 1)
+
+    problem = Problem(f'schedule_{steps}')
+    problem.add_fluent(busy, default_initial_value=False)
+    problem.add_fluent(done, default_initial_value=0)
+    problem.add_action(run)
+    machine_objects = [Object(f'machine{i}', Machine) for i in range(machines)]
+    problem.add_objects(machine_objects)
+    timed_actions = []
+    ends = [Fraction(0)] * machines
+    for i in range(steps):
+        m = i % machines
+        duration = Fraction(1 + i % 2)
+        timed_actions.append((ends[m], ActionInstance(run, (ObjectExp(machine_objects[m]),)), duration))
+        ends[m] += duration + Fraction(1, 2)
+    for m in range(machines):
+        problem.add_goal(GE(done(machine_objects[m]), len(range(m, steps, machines))))
+    return problem, TimeTriggeredPlan(timed_actions)
@@ -0,0 +1,82 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Random rollouts with the unified_planning simulator and with the Tamer one.
+
+    python benchmarks/simulator.py --rollouts 20 --horizon 50 --processes 4
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import unified_planning as up
+from unified_planning.engines.sequential_simulator import UPSequentialSimulator
+from up_tamer.simulator import SequentialSimulator
+from problems import gripper
+
+
+def up_rollouts(problem, count: int, horizon: int, seed: int) -> int:
+    simulator = UPSequentialSimulator(problem)
+    rng = random.Random(seed)
+    steps = 0
+    for _ in range(count):
+        state = simulator.get_initial_state()
+        for _ in range(horizon):
+            if simulator.is_goal(state):
+                break
+            actions = list(simulator.get_applicable_actions(state))
+            if len(actions) == 0:
+                break
+            action, parameters = actions[rng.randrange(len(actions))]
+            state = simulator.apply_unsafe(state, action, parameters)
+            steps += 1
+    return steps
+
+
+def tamer_rollouts(problem, count: int, horizon: int, seed: int, processes) -> int:
+    simulator = SequentialSimulator(problem)
+    return sum(len(r.actions) for r in simulator.rollouts(count, horizon, seed, processes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2, 4, 8, 16])
+    parser.add_argument('--rollouts', type=int, default=20)
+    parser.add_argument('--horizon', type=int, default=50)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    up.shortcuts.get_environment().credits_stream = None
+    print(f"{'balls':>6} {'simulator':>14} {'steps':>7} {'time (s)':>9} {'steps/s':>10}")
+    for n in args.sizes:
+        problem = gripper(n)
+        runs = [('unified_planning', lambda: up_rollouts(problem, args.rollouts, args.horizon, args.seed)),
+                ('tamer', lambda: tamer_rollouts(problem, args.rollouts, args.horizon, args.seed, None)),
+                (f'tamer x{args.processes}',
+                 lambda: tamer_rollouts(problem, args.rollouts, args.horizon, args.seed, args.processes))]
+        for name, run in runs:
+            start = time.perf_counter()
+            steps = run()
+            elapsed = time.perf_counter() - start
+            print(f'{n:6d} {name:>14} {steps:7d} {elapsed:9.3f} {steps / elapsed:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import socket
+import warnings
+import unified_planning as up
+import unified_planning.engines
+import unified_planning.engines.mixins
+import unified_planning.grpc.generated.unified_planning_pb2 as proto
+from unified_planning.model import ProblemKind
+from unified_planning.grpc.proto_reader import ProtobufReader
+from unified_planning.grpc.proto_writer import ProtobufWriter
+from up_tamer.engine import EngineImpl, credits
+from up_tamer.worker import PLAN_REQUEST, VALIDATION_REQUEST, PLAN_RESULT, VALIDATION_RESULT, \
+    send_message, recv_message, pack_options
+from typing import IO, Callable, Optional, Tuple
+
+
+class EngineClient(
+        up.engines.Engine,
+        up.engines.mixins.OneshotPlannerMixin,
+        up.engines.mixins.PlanValidatorMixin
+    ):
+    """
+    Tamer engine forwarding the requests to the workers started with
+    `python -m up_tamer.worker`; the options are the ones of `EngineImpl`.
+
+    The client is not registered in the factory of unified_planning, so it
+    must be constructed directly instead of through `OneshotPlanner` or
+    `PlanValidator`.
+    """
+
+    def __init__(self, socket_path: str, **options):
+        up.engines.Engine.__init__(self)
+        up.engines.mixins.OneshotPlannerMixin.__init__(self)
+        up.engines.mixins.PlanValidatorMixin.__init__(self)
+        self._socket_path = socket_path
+        self._options = {k: str(v) for k, v in options.items()}
+        self._reader = ProtobufReader()
+        self._writer = ProtobufWriter()
+
+    @property
+    def name(self) -> str:
+        return 'Tamer'
+
+    @staticmethod
+    def supported_kind() -> ProblemKind:
+        return EngineImpl.supported_kind()
+
+    @staticmethod
+    def supports(problem_kind: 'up.model.ProblemKind') -> bool:
+        return EngineImpl.supports(problem_kind)
+
+    @staticmethod
+    def supports_plan(plan_kind: 'up.plans.PlanKind') -> bool:
+        return EngineImpl.supports_plan(plan_kind)
+
+    @staticmethod
+    def satisfies(optimality_guarantee: up.engines.OptimalityGuarantee) -> bool:
+        return EngineImpl.satisfies(optimality_guarantee)
+
+    @staticmethod
+    def get_credits(**kwargs) -> Optional[up.engines.Credits]:
+        return credits
+
+    def _request(self, kind: bytes, payload: bytes) -> Tuple[bytes, bytes]:
+        # Every request uses its own connection, so that an idle client does
+        # not keep a worker busy.
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self._socket_path)
+            send_message(sock, kind, payload)
+            answer = recv_message(sock)
+        if answer is None:
+            raise up.exceptions.UPException('Connection closed by the Tamer worker!')
+        if answer[0] not in (PLAN_RESULT, VALIDATION_RESULT):
+            raise up.exceptions.UPException(f'Tamer worker error:\n{answer[1].decode()}')
+        return answer
+
+    def _validate(self, problem: 'up.model.AbstractProblem', plan: 'up.plans.Plan') -> 'up.engines.results.ValidationResult':
+        assert isinstance(problem, up.model.Problem)
+        request = proto.ValidationRequest(problem=self._writer.convert(problem),
+                                          plan=self._writer.convert(plan))
+        _, payload = self._request(VALIDATION_REQUEST, pack_options(self._options, request.SerializeToString()))
+        result = proto.ValidationResult()
+        result.ParseFromString(payload)
+        return self._reader.convert(result)
+
+    def _solve(self, problem: 'up.model.AbstractProblem',
+               heuristic: Optional[Callable[["up.model.state.State"], Optional[float]]] = None,
+               timeout: Optional[float] = None,
+               output_stream: Optional[IO[str]] = None) -> 'up.engines.results.PlanGenerationResult':
+        assert isinstance(problem, up.model.Problem)
+        if heuristic is not None:
+            raise up.exceptions.UPUsageError('Custom heuristics are not supported by the Tamer workers!')
+        if output_stream is not None:
+            warnings.warn('Tamer workers do not support output stream.', UserWarning)
+        request = proto.PlanRequest(problem=self._writer.convert(problem),
+                                    resolution_mode=proto.PlanRequest.SATISFIABLE,
+                                    timeout=timeout if timeout is not None else 0,
+                                    engine_options=self._options)
+        _, payload = self._request(PLAN_REQUEST, request.SerializeToString())
+        result = proto.PlanGenerationResult()
+        result.ParseFromString(payload)
+        return self._reader.convert(result, problem)
@@ -15,6 +15,10 @@
 
 import sys
 import time
+try:
+    import resource
+except ImportError:
+    resource = None # type: ignore
 import warnings
 import unified_planning as up
 import pytamer # type: ignore
@@ -24,9 +28,20 @@ import unified_planning.engines.mixins
 from unified_planning.model import ProblemKind
 from unified_planning.engines import PlanGenerationResultStatus, ValidationResult, ValidationResultStatus, Credits
 from up_tamer.converter import Converter
+from up_tamer.pruner import Pruner
 from fractions import Fraction
+from itertools import product
+from math import gcd
 from ConfigSpace import ConfigurationSpace
-from typing import IO, Callable, Optional, Dict, List, Tuple, Union, Set, cast
+from typing import IO, Callable, Iterator, Optional, Dict, List, Tuple, Union, Set, cast
+
+
+DEFAULT_WEIGHT = 0.8
+ANYTIME_WEIGHT_STEP = 0.1
+ANYTIME_MIN_WEIGHT = 0.5
+PROGRESS_INTERVAL = 1.0
+PROGRESS_CHECK_PERIOD = 64
+MAX_CONSTANTS_TABLE_SIZE = 1 << 12
 
 
 credits = Credits('Tamer',
@@ -59,28 +74,85 @@ class TState(up.model.State):
         return cr
 
 
+class SearchProgress:
+    """
+    Collects the statistics of a search and periodically writes them as
+    progress records on the given output stream.
+
+    Tamer keeps the interpreter locked while searching, so the counters are
+    updated from the custom heuristic callback: without a custom heuristic
+    only the start and end records are written, with the elapsed time and
+    the memory.
+
+    `peak_memory_kb` is the `ru_maxrss` of the whole process, not of the
+    search alone; despite the name, it is measured in bytes on macOS.
+    """
+    def __init__(self, output_stream: Optional[IO[str]],
+                 interval: float = PROGRESS_INTERVAL):
+        self._output_stream = output_stream
+        self._interval = interval
+        self._start = time.time()
+        self._last_report = self._start
+        self.evaluated_states = 0
+        self.best_heuristic_value: Optional[float] = None
+
+    def state_evaluated(self, value: Optional[float]):
+        self.evaluated_states += 1
+        if value is not None and (self.best_heuristic_value is None or value < self.best_heuristic_value):
+            self.best_heuristic_value = value
+        if self._output_stream is not None and self.evaluated_states % PROGRESS_CHECK_PERIOD == 0:
+            now = time.time()
+            if now - self._last_report >= self._interval:
+                self._last_report = now
+                self.report()
+
+    def report(self, event: str = 'progress'):
+        if self._output_stream is None:
+            return
+        record = ' '.join(f'{k}={v}' for k, v in self.metrics().items())
+        self._output_stream.write(f'[Tamer] {event} {record}\n')
+        self._output_stream.flush()
+
+    def metrics(self) -> Dict[str, str]:
+        res = {'elapsed_time': str(time.time() - self._start)}
+        if self.evaluated_states > 0:
+            res['evaluated_states'] = str(self.evaluated_states)
+            res['best_heuristic_value'] = str(self.best_heuristic_value)
+        if resource is not None:
+            res['peak_memory_kb'] = str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        return res
+
+
 class EngineImpl(
         up.engines.Engine,
         up.engines.mixins.OneshotPlannerMixin,
-        up.engines.mixins.PlanValidatorMixin
+        up.engines.mixins.PlanValidatorMixin,
+        up.engines.mixins.AnytimePlannerMixin
     ):
     """ Implementation of the up-tamer Engine. """
 
     def __init__(self, weight: Optional[float] = None,
                  heuristic: Optional[str] = None,
-                 weak_equality: bool = False, **options):
+                 weak_equality: bool = False,
+                 pruning: bool = False, **options):
         up.engines.Engine.__init__(self)
         up.engines.mixins.OneshotPlannerMixin.__init__(self)
         up.engines.mixins.PlanValidatorMixin.__init__(self)
+        up.engines.mixins.AnytimePlannerMixin.__init__(self)
         self._env = pytamer.tamer_env_new()
-        if not weight is None:
-            pytamer.tamer_env_set_float_option(self._env, 'weight', weight)
+        self._weight = DEFAULT_WEIGHT if weight is None else weight
+        pytamer.tamer_env_set_float_option(self._env, 'weight', self._weight)
         if weak_equality:
             pytamer.tamer_env_set_boolean_option(self._env, "weak-equality", 1)
         self._heuristic = heuristic
+        self._pruning = pruning
         if len(options) > 0:
             raise up.exceptions.UPUsageError('Custom options not supported!')
         self._bool_type = pytamer.tamer_boolean_type(self._env)
+        self._types: Dict['up.model.Type', pytamer.tamer_type] = {}
+        self._constants_tables: Dict[Tuple[int, int], List[pytamer.tamer_expr]] = {}
+        self._tamer_true = pytamer.tamer_expr_make_true(self._env)
+        self._tamer_false = pytamer.tamer_expr_make_false(self._env)
         self._tamer_start = \
             pytamer.tamer_expr_make_point_interval(self._env,
                                                    pytamer.tamer_expr_make_start_anchor(self._env))
@@ -142,6 +214,10 @@ class EngineImpl(
     def satisfies(optimality_guarantee: up.engines.OptimalityGuarantee) -> bool:
         return False
 
+    @staticmethod
+    def ensures(anytime_guarantee: up.engines.AnytimeGuarantee) -> bool:
+        return anytime_guarantee == up.engines.AnytimeGuarantee.INCREASING_QUALITY
+
     @staticmethod
     def get_credits(**kwargs) -> Optional[up.engines.Credits]:
         return credits
@@ -158,7 +234,7 @@ class EngineImpl(
         if problem.epsilon is not None:
             epsilon = problem.epsilon
         elif plan.kind == up.plans.PlanKind.TIME_TRIGGERED_PLAN:
-            epsilon = plan.extract_epsilon(problem)
+            epsilon = self._extract_epsilon(problem, cast(up.plans.TimeTriggeredPlan, plan))
         if epsilon is not None:
             pytamer.tamer_env_set_string_option(self._env, "plan-epsilon", str(epsilon))
         start = time.time()
@@ -174,9 +250,14 @@ class EngineImpl(
         assert isinstance(problem, up.model.Problem)
         if timeout is not None:
             warnings.warn('Tamer does not support timeout.', UserWarning)
-        if output_stream is not None:
-            warnings.warn('Tamer does not support output stream.', UserWarning)
-        tproblem, converter = self._convert_problem(problem)
+        # The periodic progress records are written from the heuristic
+        # callback, so they require a custom heuristic.
+        progress = SearchProgress(output_stream)
+        pruning_metrics: Dict[str, str] = {}
+        search_problem = problem
+        if self._pruning and heuristic is None:
+            search_problem, pruning_metrics = self._prune(problem)
+        tproblem, converter = self._convert_problem(search_problem)
         heuristic_fun = None
         if heuristic is not None:
             static_fluents = problem.get_static_fluents()
@@ -184,11 +265,99 @@ class EngineImpl(
                     interpretation: pytamer.tamer_interpretation) -> float:
                 s = TState(ts, interpretation, converter, problem, static_fluents)
                 res = heuristic(s)
+                progress.state_evaluated(res)
                 if res is None:
                     return -1
                 else:
                     return res
             heuristic_fun = fun
+        self._set_search_options(problem, heuristic is not None)
+        progress.report('start')
+        ttplan, solving_time = self._search(problem, tproblem, heuristic_fun)
+        plan = self._to_up_plan(problem, ttplan)
+        status = PlanGenerationResultStatus.UNSOLVABLE_INCOMPLETELY if plan is None else PlanGenerationResultStatus.SOLVED_SATISFICING
+        progress.report('end')
+        metrics = {"engine_internal_time": str(solving_time)}
+        metrics.update(pruning_metrics)
+        metrics.update(progress.metrics())
+        return up.engines.PlanGenerationResult(status, plan, self.name, metrics=metrics)
+
+    def _get_solutions(self, problem: 'up.model.AbstractProblem',
+                       timeout: Optional[float] = None,
+                       output_stream: Optional[IO[str]] = None) -> Iterator['up.engines.results.PlanGenerationResult']:
+        assert isinstance(problem, up.model.Problem)
+        if timeout is not None:
+            warnings.warn('Tamer only enforces the timeout between the searches of the anytime mode.', UserWarning)
+        progress = SearchProgress(output_stream)
+        pruning_metrics: Dict[str, str] = {}
+        search_problem = problem
+        if self._pruning:
+            search_problem, pruning_metrics = self._prune(problem)
+        tproblem, _ = self._convert_problem(search_problem)
+        self._set_search_options(problem, False)
+        start = time.time()
+        best_cost: Optional[Fraction] = None
+        timed_out = False
+        try:
+            for weight in self._anytime_weights():
+                if timeout is not None and time.time() - start >= timeout:
+                    timed_out = True
+                    break
+                pytamer.tamer_env_set_float_option(self._env, 'weight', weight)
+                progress.report('start')
+                ttplan, solving_time = self._search(problem, tproblem, None)
+                plan = self._to_up_plan(problem, ttplan)
+                progress.report('end')
+                if plan is None:
+                    break
+                cost = self._plan_cost(plan)
+                if best_cost is None or cost < best_cost:
+                    best_cost = cost
+                    metrics = {"engine_internal_time": str(solving_time),
+                               "weight": str(weight),
+                               "plan_cost": str(cost)}
+                    metrics.update(pruning_metrics)
+                    metrics.update(progress.metrics())
+                    yield up.engines.PlanGenerationResult(PlanGenerationResultStatus.INTERMEDIATE,
+                                                          plan, self.name, metrics=metrics)
+        finally:
+            pytamer.tamer_env_set_float_option(self._env, 'weight', self._weight)
+        if best_cost is None:
+            status = PlanGenerationResultStatus.TIMEOUT if timed_out else PlanGenerationResultStatus.UNSOLVABLE_INCOMPLETELY
+            metrics = {"engine_internal_time": str(time.time() - start)}
+            metrics.update(pruning_metrics)
+            metrics.update(progress.metrics())
+            yield up.engines.PlanGenerationResult(status, None, self.name, metrics=metrics)
+
+    def _prune(self, problem: 'up.model.Problem') -> Tuple['up.model.Problem', Dict[str, str]]:
+        start = time.time()
+        pruned_problem, metrics = Pruner(problem).prune()
+        metrics["pruning_time"] = str(time.time() - start)
+        return pruned_problem, metrics
+
+    def _anytime_weights(self) -> Iterator[float]:
+        """
+        Returns the decreasing sequence of weights used by the anytime search,
+        starting from the configured weight and never going above it.
+        """
+        weight = self._weight
+        while weight > ANYTIME_MIN_WEIGHT:
+            yield weight
+            weight = round(weight - ANYTIME_WEIGHT_STEP, 2)
+        yield min(self._weight, ANYTIME_MIN_WEIGHT)
+
+    def _plan_cost(self, plan: 'up.plans.Plan') -> Fraction:
+        """Returns the length of a sequential plan or the makespan of a time triggered plan."""
+        if isinstance(plan, up.plans.SequentialPlan):
+            return Fraction(len(plan.actions))
+        assert isinstance(plan, up.plans.TimeTriggeredPlan)
+        makespan = Fraction(0)
+        for start, _, duration in plan.timed_actions:
+            end = start if duration is None else start + duration
+            makespan = max(makespan, end)
+        return makespan
+
+    def _set_search_options(self, problem: 'up.model.Problem', custom_heuristic: bool):
         if problem.kind.has_continuous_time():
             pytamer.tamer_env_set_boolean_option(self._env, "simultaneity", 1)
             pytamer.tamer_env_set_boolean_option(self._env, "ftp-deordering-plan", 1)
@@ -199,7 +368,7 @@ class EngineImpl(
                     assert isinstance(self._heuristic, list)
                     heuristics = self._heuristic
                 pytamer.tamer_env_set_vector_string_option(self._env, 'ftp-heuristic', heuristics)
-            elif heuristic is not None:
+            elif custom_heuristic:
                 pytamer.tamer_env_set_vector_string_option(self._env, 'ftp-heuristic', [])
             else:
                 pytamer.tamer_env_set_vector_string_option(self._env, 'ftp-heuristic', ['hadd'])
@@ -207,20 +376,23 @@ class EngineImpl(
                 pytamer.tamer_env_set_string_option(self._env, "plan-epsilon", str(problem.epsilon))
             else:
                 pytamer.tamer_env_set_string_option(self._env, "plan-epsilon", "0.01")
+        else:
+            if self._heuristic is not None:
+                pytamer.tamer_env_set_string_option(self._env, 'tsimple-heuristic', self._heuristic)
+            else:
+                pytamer.tamer_env_set_string_option(self._env, 'tsimple-heuristic', "hadd")
+
+    def _search(self, problem: 'up.model.Problem', tproblem: pytamer.tamer_problem,
+                heuristic_fun) -> Tuple[Optional[pytamer.tamer_ttplan], float]:
+        if problem.kind.has_continuous_time():
             start = time.time()
             ttplan = pytamer.tamer_do_ftp_planning(tproblem, heuristic_fun)
             solving_time = time.time() - start
             if pytamer.tamer_ttplan_is_error(ttplan) == 1:
                 ttplan = None
+            return ttplan, solving_time
         else:
-            if self._heuristic is not None:
-                pytamer.tamer_env_set_string_option(self._env, 'tsimple-heuristic', self._heuristic)
-            else:
-                pytamer.tamer_env_set_string_option(self._env, 'tsimple-heuristic', "hadd")
-            ttplan, solving_time = self._solve_classical_problem(tproblem, heuristic_fun)
-        plan = self._to_up_plan(problem, ttplan)
-        status = PlanGenerationResultStatus.UNSOLVABLE_INCOMPLETELY if plan is None else PlanGenerationResultStatus.SOLVED_SATISFICING
-        return up.engines.PlanGenerationResult(status, plan, self.name, metrics={"engine_internal_time": str(solving_time)})
+            return self._solve_classical_problem(tproblem, heuristic_fun)
 
     def _convert_type(self, typename: 'up.model.Type',
                       user_types_map: Dict['up.model.Type', pytamer.tamer_type]) -> pytamer.tamer_type:
@@ -228,6 +400,8 @@ class EngineImpl(
             ttype = self._bool_type
         elif typename.is_user_type():
             ttype = user_types_map[typename]
+        elif typename in self._types:
+            ttype = self._types[typename]
         elif typename.is_int_type():
             typename = cast(up.model.types._IntType, typename)
             ilb = typename.lower_bound
@@ -254,8 +428,73 @@ class EngineImpl(
                 ttype = pytamer.tamer_rational_type_lub(self._env, float(flb), float(fub))
         else:
             raise NotImplementedError
+        if typename.is_int_type() or typename.is_real_type():
+            self._types[typename] = ttype
         return ttype
 
+    def _constants_table(self, typename: 'up.model.Type') -> Optional[List[pytamer.tamer_expr]]:
+        """
+        Returns the integer constants of a bounded integer type, from the lower
+        to the upper bound; the table is built once for every range.
+        """
+        typename = cast(up.model.types._IntType, typename)
+        ilb = typename.lower_bound
+        iub = typename.upper_bound
+        if ilb is None or iub is None or iub - ilb >= MAX_CONSTANTS_TABLE_SIZE:
+            return None
+        table = self._constants_tables.get((ilb, iub), None)
+        if table is None:
+            table = [pytamer.tamer_expr_make_integer_constant(self._env, v) for v in range(ilb, iub + 1)]
+            self._constants_tables[(ilb, iub)] = table
+        return table
+
+    def _constant_converter(self, typename: 'up.model.Type',
+                            instances_refs: Dict[str, pytamer.tamer_expr],
+                            use_table: bool = True) -> Callable[['up.model.FNode'], pytamer.tamer_expr]:
+        """
+        Returns a function converting the constants of the given type, without
+        walking them and sharing the converted expressions.
+
+        The integer constants are taken from the constants table of the type
+        only if `use_table` is set, as it is meant for the parameter types;
+        otherwise, as for the real constants, they are converted on demand
+        and shared by value.
+        """
+        if typename.is_bool_type():
+            return lambda c: self._tamer_true if c.is_true() else self._tamer_false
+        elif typename.is_user_type():
+            return lambda c: instances_refs[c.object().name]
+        elif typename.is_int_type():
+            table = self._constants_table(typename) if use_table else None
+            if table is not None:
+                ilb = cast(up.model.types._IntType, typename).lower_bound
+                def convert_int(c: 'up.model.FNode') -> pytamer.tamer_expr:
+                    i = c.constant_value() - ilb
+                    if 0 <= i < len(table):
+                        return table[i]
+                    return pytamer.tamer_expr_make_integer_constant(self._env, c.constant_value())
+                return convert_int
+            ints: Dict[int, pytamer.tamer_expr] = {}
+            def convert_cached_int(c: 'up.model.FNode') -> pytamer.tamer_expr:
+                v = c.constant_value()
+                res = ints.get(v, None)
+                if res is None:
+                    res = pytamer.tamer_expr_make_integer_constant(self._env, v)
+                    ints[v] = res
+                return res
+            return convert_cached_int
+        elif typename.is_real_type():
+            reals: Dict[Fraction, pytamer.tamer_expr] = {}
+            def convert_real(c: 'up.model.FNode') -> pytamer.tamer_expr:
+                f = Fraction(c.constant_value())
+                res = reals.get(f, None)
+                if res is None:
+                    res = pytamer.tamer_expr_make_rational_constant(self._env, f.numerator, f.denominator)
+                    reals[f] = res
+                return res
+            return convert_real
+        raise NotImplementedError
+
     def _convert_fluent(self, fluent: 'up.model.Fluent',
                         user_types_map: Dict['up.model.Type', pytamer.tamer_type]) -> pytamer.tamer_fluent:
         typename = fluent.type
@@ -282,6 +521,54 @@ class EngineImpl(
             pytamer.tamer_function_value_add_assignment(values, key, value)
         return pytamer.tamer_constant_new(self._env, constant.name, ttype, [], params, values)
 
+    def _parameter_domain(self, problem: 'up.model.Problem', typename: 'up.model.Type',
+                          instances_refs: Dict[str, pytamer.tamer_expr]) -> List[Tuple[object, pytamer.tamer_expr]]:
+        """Returns the values of a fluent parameter type, with their converted expressions."""
+        if typename.is_bool_type():
+            return [(False, self._tamer_false), (True, self._tamer_true)]
+        elif typename.is_user_type():
+            return [(o, instances_refs[o.name]) for o in problem.objects(typename)]
+        elif typename.is_int_type():
+            typename = cast(up.model.types._IntType, typename)
+            ilb = typename.lower_bound
+            iub = typename.upper_bound
+            if ilb is not None and iub is not None:
+                table = self._constants_table(typename)
+                if table is not None:
+                    return list(zip(range(ilb, iub + 1), table))
+                return [(v, pytamer.tamer_expr_make_integer_constant(self._env, v)) for v in range(ilb, iub + 1)]
+        raise up.exceptions.UPUsageError(f'Fluent parameters of type {typename} can not be grounded!')
+
+    def _initial_values(self, problem: 'up.model.Problem',
+                        instances_refs: Dict[str, pytamer.tamer_expr]) -> Iterator[Tuple['up.model.Fluent', List[pytamer.tamer_expr], pytamer.tamer_expr]]:
+        """
+        Yields the converted arguments and value of every grounded fluent with
+        an initial value, like `problem.initial_values` but without creating
+        an expression for every grounded fluent.
+        """
+        explicit: Dict['up.model.Fluent', List[Tuple['up.model.FNode', 'up.model.FNode']]] = {}
+        for k, v in problem.explicit_initial_values.items():
+            explicit.setdefault(k.fluent(), []).append((k, v))
+        defaults = problem.fluents_defaults
+        value_converters: Dict['up.model.Type', Callable[['up.model.FNode'], pytamer.tamer_expr]] = {}
+        for f in problem.fluents:
+            value_converter = value_converters.get(f.type, None)
+            if value_converter is None:
+                value_converter = self._constant_converter(f.type, instances_refs, use_table=False)
+                value_converters[f.type] = value_converter
+            if f not in defaults:
+                args_converters = [self._constant_converter(p.type, instances_refs) for p in f.signature]
+                for k, v in explicit.get(f, []):
+                    yield f, [c(a) for c, a in zip(args_converters, k.args)], value_converter(v)
+                continue
+            values = {tuple(a.object() if a.is_object_exp() else a.constant_value() for a in k.args): v
+                      for k, v in explicit.get(f, [])}
+            default = value_converter(defaults[f])
+            domains = [self._parameter_domain(problem, p.type, instances_refs) for p in f.signature]
+            for args in product(*domains):
+                v = values.get(tuple(a[0] for a in args), None)
+                yield f, [a[1] for a in args], default if v is None else value_converter(v)
+
     def _convert_timing(self, timing: 'up.model.Timing') -> pytamer.tamer_expr:
         k = Fraction(timing.delay)
         if k < 0:
@@ -434,6 +721,7 @@ class EngineImpl(
         user_types_map = {}
         instances = []
         instances_map = {}
+        instances_refs = {}
         for ut in problem.user_types:
             name = cast(up.model.types._UserType, ut).name
             new_ut = pytamer.tamer_user_type_new(self._env, name)
@@ -443,6 +731,7 @@ class EngineImpl(
                 new_obj = pytamer.tamer_instance_new(self._env, obj.name, user_types_map[ut])
                 instances.append(new_obj)
                 instances_map[obj] = new_obj
+                instances_refs[obj.name] = pytamer.tamer_expr_make_instance_reference(self._env, new_obj)
 
         fluents = []
         fluents_map = {}
@@ -454,20 +743,17 @@ class EngineImpl(
                 fluents_map[f] = new_f
 
         expressions = []
-        converter = Converter(self._env, problem, fluents_map, {}, instances_map)
         constants_assignments = {}
-        for k, v in problem.initial_values.items():
-            if k.type.is_real_type() and v.is_int_constant():
-                v = problem.environment.expression_manager.Real(Fraction(v.constant_value()))
-            if k.fluent() not in static_fluents:
-                ass = pytamer.tamer_expr_make_assign(self._env, converter.convert(k), converter.convert(v))
+        for f, args, value in self._initial_values(problem, instances_refs):
+            if f not in static_fluents:
+                ref = pytamer.tamer_expr_make_fluent_reference(self._env, fluents_map[f], args)
+                ass = pytamer.tamer_expr_make_assign(self._env, ref, value)
                 expr = pytamer.tamer_expr_make_temporal_expression(self._env, self._tamer_start, ass)
                 expressions.append(expr)
             else:
-                if k.fluent() not in constants_assignments:
-                    constants_assignments[k.fluent()] = []
-                constants_assignments[k.fluent()].append(([converter.convert(ki) for ki in k.args],
-                                                          converter.convert(v)))
+                if f not in constants_assignments:
+                    constants_assignments[f] = []
+                constants_assignments[f].append((args, value))
 
         constants = []
         constants_map = {}
@@ -539,43 +825,95 @@ class EngineImpl(
         return ttplan, solving_time
 
     def _convert_plan(self, tproblem: pytamer.tamer_problem, plan: 'up.plans.Plan') -> pytamer.tamer_ttplan:
+        if isinstance(plan, up.plans.SequentialPlan):
+            actions = plan.actions
+            starts = [str(i*2) for i in range(len(actions))]
+            durations = ['1'] * len(actions)
+        elif isinstance(plan, up.plans.TimeTriggeredPlan):
+            actions = [ai for _, ai, _ in plan.timed_actions]
+            starts = [str(start) for start, _, _ in plan.timed_actions]
+            durations = ['1' if d is None else str(d) for _, _, d in plan.timed_actions]
+        else:
+            raise NotImplementedError
+        # Every distinct action instance is converted once; the steps refer
+        # to it by index.
+        indices = []
+        instances = []
+        ground: Dict[Tuple[str, Tuple['up.model.FNode', ...]], int] = {}
+        for ai in actions:
+            key = (ai.action.name, ai.actual_parameters)
+            i = ground.get(key, None)
+            if i is None:
+                i = len(instances)
+                ground[key] = i
+                instances.append(ai)
+            indices.append(i)
+        return self._convert_steps(tproblem, starts, durations, indices, instances)
+
+    def _convert_steps(self, tproblem: pytamer.tamer_problem, starts: List[str], durations: List[str],
+                       indices: List[int], instances: List['up.plans.ActionInstance']) -> pytamer.tamer_ttplan:
+        """
+        Builds the Tamer plan whose i-th step starts at `starts[i]`, lasts
+        `durations[i]` and executes the action instance `instances[indices[i]]`.
+        """
         actions_map = {}
         for a in pytamer.tamer_problem_get_actions(tproblem):
             actions_map[pytamer.tamer_action_get_name(a)] = a
-        instances_map = {}
+        instances_refs = {}
         for i in pytamer.tamer_problem_get_instances(tproblem):
-            instances_map[pytamer.tamer_instance_get_name(i)] = i
+            instances_refs[pytamer.tamer_instance_get_name(i)] = pytamer.tamer_expr_make_instance_reference(self._env, i)
+        params_converters: Dict[str, List[Callable[['up.model.FNode'], pytamer.tamer_expr]]] = {}
+        tactions = []
+        tparams = []
+        for ai in instances:
+            name = ai.action.name
+            converters = params_converters.get(name, None)
+            if converters is None:
+                converters = [self._constant_converter(p.type, instances_refs) for p in ai.action.parameters]
+                params_converters[name] = converters
+            tactions.append(actions_map[name])
+            tparams.append([c(p) for c, p in zip(converters, ai.actual_parameters)])
         ttplan = pytamer.tamer_ttplan_new(self._env)
-        steps: List[Tuple[Fraction, 'up.plans.ActionInstance', Optional[Fraction]]] = []
-        if isinstance(plan, up.plans.SequentialPlan):
-            steps = [(Fraction(i*2), a, Fraction(1)) for i, a in enumerate(plan.actions)]
-        elif isinstance(plan, up.plans.TimeTriggeredPlan):
-            steps = plan.timed_actions
-        else:
-            raise NotImplementedError
-        for start, ai, duration in steps:
-            if duration is None:
-                duration = 1
-            action = actions_map[ai.action.name]
-            params = []
-            for p in ai.actual_parameters:
-                if p.is_object_exp():
-                    i = instances_map[p.object().name]
-                    params.append(pytamer.tamer_expr_make_instance_reference(self._env, i))
-                elif p.is_true():
-                    params.append(pytamer.tamer_expr_make_true(self._env))
-                elif p.is_false():
-                    params.append(pytamer.tamer_expr_make_false(self._env))
-                elif p.is_int_constant():
-                    params.append(pytamer.tamer_expr_make_integer_constant(self._env, p.constant_value()))
-                elif p.is_real_constant():
-                    f = p.constant_value()
-                    n = f.numerator
-                    d = f.denominator
-                    params.append(pytamer.tamer_expr_make_rational_constant(self._env, n, d))
-                else:
-                    raise NotImplementedError
-            step = pytamer.tamer_ttplan_step_new(str(start), action, params, str(duration), \
-                                                 pytamer.tamer_expr_make_true(self._env))
+        post_condition = self._tamer_true
+        for start, duration, i in zip(starts, durations, indices):
+            step = pytamer.tamer_ttplan_step_new(start, tactions[i], tparams[i], duration, post_condition)
             pytamer.tamer_ttplan_add_step(ttplan, step)
         return ttplan
+
+    def _extract_epsilon(self, problem: 'up.model.Problem', plan: 'up.plans.TimeTriggeredPlan') -> Optional[Fraction]:
+        """
+        Returns the same epsilon as `plan.extract_epsilon(problem)`, collecting
+        the relative timings of every action once instead of once per step.
+        """
+        times: Set[Fraction] = {Fraction(0)}
+        for i in problem.timed_goals.keys():
+            times.add(Fraction(i.lower.delay))
+            times.add(Fraction(i.upper.delay))
+        for t in problem.timed_effects.keys():
+            times.add(Fraction(t.delay))
+        offsets: Dict[str, List[Tuple[bool, Fraction]]] = {}
+        for start, ai, duration in plan.timed_actions:
+            times.add(start)
+            if duration is None:
+                continue
+            end = start + duration
+            times.add(end)
+            action_offsets = offsets.get(ai.action.name, None)
+            if action_offsets is None:
+                action = cast(up.model.DurativeAction, ai.action)
+                timings = list(action.effects.keys()) + list(action.simulated_effects.keys())
+                for interval in action.conditions.keys():
+                    timings.extend([interval.lower, interval.upper])
+                action_offsets = list({(t.is_from_start(), Fraction(t.delay)) for t in timings if t.delay != 0})
+                offsets[ai.action.name] = action_offsets
+            for from_start, delay in action_offsets:
+                times.add((start if from_start else end) + delay)
+        if len(times) < 2:
+            return None
+        # Sorting integers over a common denominator is much faster than
+        # sorting the fractions.
+        denominator = 1
+        for d in {t.denominator for t in times}:
+            denominator = denominator * d // gcd(denominator, d)
+        sorted_times = sorted(t.numerator * (denominator // t.denominator) for t in times)
+        return Fraction(min(b - a for a, b in zip(sorted_times, sorted_times[1:])), denominator)
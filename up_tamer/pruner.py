@@ -0,0 +1,324 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unified_planning as up
+import unified_planning.model.metrics
+from unified_planning.model import FNode
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class Pruner:
+    """
+    Removes from a problem the actions, fluents and objects that can not be
+    part of a plan, before the problem is converted to Tamer.
+
+    The analysis is lifted and conservative:
+     - an action is unreachable if one of its positive static preconditions
+       has no instance in the initial state compatible with the action
+       parameters, or if one of its boolean conditions at start refers to a
+       fluent that can never get the required value in the delete relaxation;
+     - a fluent is relevant if it has a bounded numeric type, or if it
+       appears in a goal or in a condition, a duration or an effect value of
+       a reachable action affecting a relevant fluent; the other actions are
+       dropped, together with the effects on irrelevant fluents;
+     - an object is kept only if it can be bound to a parameter of a kept
+       action or if it is explicitly referenced by the problem.
+
+    Action and object names are preserved, so a plan of the pruned problem is
+    also a plan of the original problem once its actions are looked up by name.
+    """
+    def __init__(self, problem: 'up.model.Problem'):
+        self._problem = problem
+        self._static_fluents = problem.get_static_fluents()
+        self._free_vars = problem.environment.free_vars_extractor
+        self._initial_values = problem.initial_values
+        self._static_true: Dict['up.model.Fluent', Set[Tuple[FNode, ...]]] = {}
+        for k, v in self._initial_values.items():
+            if k.fluent() in self._static_fluents and v.is_true():
+                self._static_true.setdefault(k.fluent(), set()).add(tuple(k.args))
+
+    def prune(self) -> Tuple['up.model.Problem', Dict[str, str]]:
+        """Returns the pruned problem and the metrics describing the reduction."""
+        problem = self._problem
+        candidates = {}
+        for a in problem.actions:
+            c = self._parameters_candidates(a)
+            if c is not None:
+                candidates[a] = c
+        reachable = self._reachable_actions([a for a in problem.actions if a in candidates])
+        relevant_fluents = self._relevant_fluents(reachable)
+        actions = [a for a in reachable if self._is_relevant(a, relevant_fluents)]
+        fluents = [f for f in problem.fluents if f in relevant_fluents]
+        objects = self._kept_objects(actions, fluents, candidates)
+
+        new_problem = up.model.Problem(problem.name, problem.environment)
+        for f in fluents:
+            new_problem.add_fluent(f)
+        new_problem.add_objects(objects)
+        kept_objects = set(objects)
+        for k, v in self._initial_values.items():
+            if k.fluent() in relevant_fluents and \
+               all(not x.is_object_exp() or x.object() in kept_objects for x in k.args):
+                new_problem.set_initial_value(k, v)
+        for a in actions:
+            new_problem.add_action(self._pruned_action(a, relevant_fluents))
+        for g in problem.goals:
+            new_problem.add_goal(g)
+        for t, le in problem.timed_effects.items():
+            for e in le:
+                if e.fluent.fluent() in relevant_fluents:
+                    new_problem.add_timed_effect(t, e.fluent, e.value)
+        for i, lg in problem.timed_goals.items():
+            for g in lg:
+                new_problem.add_timed_goal(i, g)
+        for m in problem.quality_metrics:
+            new_problem.add_quality_metric(m)
+        new_problem.epsilon = problem.epsilon
+
+        metrics = {"pruned_actions": str(len(problem.actions) - len(actions)),
+                   "pruned_fluents": str(len(problem.fluents) - len(fluents)),
+                   "pruned_objects": str(len(problem.all_objects) - len(objects))}
+        return new_problem, metrics
+
+    def _conditions(self, action: 'up.model.Action') -> List[FNode]:
+        if isinstance(action, up.model.InstantaneousAction):
+            return list(action.preconditions)
+        assert isinstance(action, up.model.DurativeAction)
+        return [c for lc in action.conditions.values() for c in lc]
+
+    def _start_conditions(self, action: 'up.model.Action') -> List[FNode]:
+        """
+        Returns the conditions that must hold before any effect of the action;
+        the later conditions of a durative action can be achieved by its own
+        earlier effects.
+        """
+        if isinstance(action, up.model.InstantaneousAction):
+            return list(action.preconditions)
+        assert isinstance(action, up.model.DurativeAction)
+        start = up.model.StartTiming()
+        return [c for i, lc in action.conditions.items()
+                if i.lower == start and not i.is_left_open() for c in lc]
+
+    def _effects(self, action: 'up.model.Action') -> List['up.model.Effect']:
+        if isinstance(action, up.model.InstantaneousAction):
+            return list(action.effects)
+        assert isinstance(action, up.model.DurativeAction)
+        return [e for le in action.effects.values() for e in le]
+
+    def _simulated_fluents(self, action: 'up.model.Action') -> Optional[List[FNode]]:
+        if isinstance(action, up.model.InstantaneousAction):
+            se = [action.simulated_effect] if action.simulated_effect is not None else []
+        else:
+            assert isinstance(action, up.model.DurativeAction)
+            se = list(action.simulated_effects.values())
+        if len(se) == 0:
+            return None
+        return [f for s in se for f in s.fluents]
+
+    def _literals(self, conditions: Iterable[FNode]) -> List[Tuple[FNode, bool]]:
+        """Returns the boolean fluent literals that are conjuncts of the given conditions."""
+        res = []
+        stack = list(conditions)
+        while len(stack) > 0:
+            c = stack.pop()
+            if c.is_and():
+                stack.extend(c.args)
+            elif c.is_fluent_exp():
+                res.append((c, True))
+            elif c.is_not() and c.arg(0).is_fluent_exp():
+                res.append((c.arg(0), False))
+        return res
+
+    def _parameters_candidates(self, action: 'up.model.Action') -> Optional[Dict['up.model.Parameter', Set['up.model.Object']]]:
+        """
+        Returns, for each user-typed parameter of the action, the objects that
+        satisfy its positive static preconditions, or None if the action can
+        never be applied.
+        """
+        res = {}
+        for p in action.parameters:
+            if p.type.is_user_type():
+                res[p] = set(self._problem.objects(p.type))
+        for atom, positive in self._literals(self._conditions(action)):
+            f = atom.fluent()
+            if not positive or f not in self._static_fluents:
+                continue
+            tuples = self._static_true.get(f, set())
+            for i, arg in enumerate(atom.args):
+                if arg.is_parameter_exp() and arg.parameter() in res:
+                    res[arg.parameter()] &= {t[i].object() for t in tuples}
+                elif arg.is_object_exp() or arg.is_constant():
+                    tuples = {t for t in tuples if t[i] == arg}
+            if len(tuples) == 0:
+                return None
+        if any(len(c) == 0 for c in res.values()):
+            return None
+        return res
+
+    def _reachable_actions(self, actions: List['up.model.Action']) -> List['up.model.Action']:
+        """Computes the actions reachable in the delete relaxation over fluent symbols."""
+        can_be_true: Set['up.model.Fluent'] = set()
+        can_be_false: Set['up.model.Fluent'] = set()
+        for k, v in self._initial_values.items():
+            if v.is_true():
+                can_be_true.add(k.fluent())
+            elif v.is_false():
+                can_be_false.add(k.fluent())
+        effects = [e for le in self._problem.timed_effects.values() for e in le]
+        reachable: Set['up.model.Action'] = set()
+        changed = True
+        while changed:
+            for e in effects:
+                f = e.fluent.fluent()
+                if f.type.is_bool_type():
+                    if not e.value.is_false():
+                        can_be_true.add(f)
+                    if not e.value.is_true():
+                        can_be_false.add(f)
+            changed = False
+            effects = []
+            for a in actions:
+                if a in reachable:
+                    continue
+                if all(atom.fluent() in (can_be_true if positive else can_be_false)
+                       for atom, positive in self._literals(self._start_conditions(a))):
+                    reachable.add(a)
+                    effects.extend(self._effects(a))
+                    sf = self._simulated_fluents(a)
+                    if sf is not None:
+                        for x in sf:
+                            can_be_true.add(x.fluent())
+                            can_be_false.add(x.fluent())
+                    changed = True
+        return [a for a in actions if a in reachable]
+
+    def _fluents_in(self, expressions: Iterable[FNode]) -> Set['up.model.Fluent']:
+        return {fe.fluent() for e in expressions for fe in self._free_vars.get(e)}
+
+    def _relevant_fluents(self, actions: List['up.model.Action']) -> Set['up.model.Fluent']:
+        problem = self._problem
+        if len(problem.quality_metrics) > 0 or \
+           any(self._simulated_fluents(a) is not None for a in actions):
+            return set(problem.fluents)
+        relevant = self._fluents_in(problem.goals)
+        # An effect on a bounded numeric fluent can make its action
+        # inapplicable, so it can never be dropped.
+        relevant |= {f for f in problem.fluents if self._is_bounded(f.type)}
+        relevant |= self._fluents_in(g for lg in problem.timed_goals.values() for g in lg)
+        timed_effects = [e for le in problem.timed_effects.values() for e in le]
+        todo = list(actions)
+        changed = True
+        while changed:
+            changed = False
+            for e in timed_effects:
+                if e.fluent.fluent() in relevant:
+                    new = self._fluents_in([e.fluent, e.value]) - relevant
+                    if len(new) > 0:
+                        relevant |= new
+                        changed = True
+            for a in list(todo):
+                if self._is_relevant(a, relevant):
+                    todo.remove(a)
+                    expressions = self._conditions(a)
+                    for e in self._effects(a):
+                        if e.fluent.fluent() in relevant:
+                            expressions.extend([e.fluent, e.value])
+                    if isinstance(a, up.model.DurativeAction):
+                        expressions.extend([a.duration.lower, a.duration.upper])
+                    relevant |= self._fluents_in(expressions)
+                    changed = True
+        return relevant
+
+    def _is_bounded(self, typename: 'up.model.Type') -> bool:
+        if typename.is_int_type() or typename.is_real_type():
+            return typename.lower_bound is not None or typename.upper_bound is not None # type: ignore
+        return False
+
+    def _is_relevant(self, action: 'up.model.Action', relevant: Set['up.model.Fluent']) -> bool:
+        if any(e.fluent.fluent() in relevant for e in self._effects(action)):
+            return True
+        sf = self._simulated_fluents(action)
+        return sf is not None and any(x.fluent() in relevant for x in sf)
+
+    def _objects_in(self, expressions: Iterable[FNode]) -> Set['up.model.Object']:
+        res = set()
+        stack = list(expressions)
+        while len(stack) > 0:
+            e = stack.pop()
+            if e.is_object_exp():
+                res.add(e.object())
+            stack.extend(e.args)
+        return res
+
+    def _kept_objects(self, actions: List['up.model.Action'], fluents: List['up.model.Fluent'],
+                      candidates: Dict['up.model.Action', Dict['up.model.Parameter', Set['up.model.Object']]]) -> List['up.model.Object']:
+        problem = self._problem
+        kept = set()
+        for a in actions:
+            for c in candidates[a].values():
+                kept |= c
+        expressions = list(problem.goals)
+        expressions.extend(g for lg in problem.timed_goals.values() for g in lg)
+        for le in problem.timed_effects.values():
+            for e in le:
+                expressions.extend([e.fluent, e.value])
+        for a in actions:
+            expressions.extend(self._conditions(a))
+            for e in self._effects(a):
+                expressions.extend([e.fluent, e.value])
+            sf = self._simulated_fluents(a)
+            if sf is not None:
+                expressions.extend(sf)
+            if isinstance(a, up.model.DurativeAction):
+                expressions.extend([a.duration.lower, a.duration.upper])
+        for m in problem.quality_metrics:
+            expressions.extend(self._metric_expressions(m))
+        object_fluents = {f for f in fluents if f.type.is_user_type()}
+        expressions.extend(v for k, v in self._initial_values.items() if k.fluent() in object_fluents)
+        kept |= self._objects_in(expressions)
+        return [o for o in problem.all_objects if o in kept]
+
+    def _metric_expressions(self, metric: 'up.model.PlanQualityMetric') -> List[FNode]:
+        if isinstance(metric, (up.model.metrics.MinimizeExpressionOnFinalState,
+                               up.model.metrics.MaximizeExpressionOnFinalState)):
+            return [metric.expression]
+        elif isinstance(metric, up.model.metrics.MinimizeActionCosts):
+            res = list(metric.costs.values())
+            if metric.default is not None:
+                res.append(metric.default)
+            return res
+        elif isinstance(metric, up.model.metrics.Oversubscription):
+            return list(metric.goals.keys())
+        elif isinstance(metric, up.model.metrics.TemporalOversubscription):
+            return [g for _, g in metric.goals.keys()]
+        return []
+
+    def _pruned_action(self, action: 'up.model.Action', relevant: Set['up.model.Fluent']) -> 'up.model.Action':
+        """Returns the action without the effects on irrelevant fluents."""
+        if all(e.fluent.fluent() in relevant for e in self._effects(action)):
+            return action
+        new_action = action.clone()
+        new_action.clear_effects()
+        if isinstance(action, up.model.InstantaneousAction):
+            for e in action.effects:
+                if e.fluent.fluent() in relevant:
+                    new_action._add_effect_instance(e)
+        else:
+            assert isinstance(action, up.model.DurativeAction)
+            for t, le in action.effects.items():
+                for e in le:
+                    if e.fluent.fluent() in relevant:
+                        new_action._add_effect_instance(t, e)
+        return new_action
@@ -0,0 +1,433 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import multiprocessing
+import random
+import warnings
+import unified_planning as up
+import unified_planning.engines
+import unified_planning.engines.mixins
+import unified_planning.plans
+from unified_planning.model import FNode, ProblemKind
+from up_tamer.engine import credits
+from fractions import Fraction
+from itertools import product
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+Values = Tuple[Any, ...]
+Evaluator = Callable[[Values, Tuple[Any, ...]], Any]
+
+
+class SimulatorState(up.model.State):
+    """State of the `SequentialSimulator`: the values of all the grounded fluents."""
+    __slots__ = ('_values', '_simulator')
+
+    def __init__(self, values: Values, simulator: 'SequentialSimulator'):
+        self._values = values
+        self._simulator = simulator
+
+    def get_value(self, f: 'up.model.FNode') -> 'up.model.FNode':
+        i = self._simulator._index[(f.fluent(), tuple(self._simulator._constant_value(a) for a in f.args))]
+        return self._simulator._to_fnode[i](self._values[i])
+
+    def __hash__(self) -> int:
+        return hash(self._values)
+
+    def __eq__(self, oth: object) -> bool:
+        return isinstance(oth, SimulatorState) and self._values == oth._values
+
+
+class Rollout(NamedTuple):
+    actions: List['up.plans.ActionInstance']
+    state: SimulatorState
+    goal: bool
+
+
+class _CompiledAction:
+    def __init__(self, preconditions: List[Evaluator],
+                 effects: List[Tuple[Evaluator, Evaluator, Optional[Evaluator], str]],
+                 simulated_effect: Optional[Tuple[List[Evaluator], 'up.model.SimulatedEffect']]):
+        self.preconditions = preconditions
+        self.effects = effects
+        self.simulated_effect = simulated_effect
+
+
+# The simulator and the policy of the parallel rollouts are inherited by the
+# forked processes, so they do not need to be pickled.
+_ROLLOUT_SIMULATOR: Optional['SequentialSimulator'] = None
+_ROLLOUT_POLICY: Optional[Callable] = None
+
+
+def _rollouts_chunk(args: Tuple[List[int], int]) -> List[Tuple[List[int], bool]]:
+    seeds, horizon = args
+    assert _ROLLOUT_SIMULATOR is not None
+    return [_ROLLOUT_SIMULATOR._rollout(s, horizon, _ROLLOUT_POLICY) for s in seeds]
+
+
+class SequentialSimulator(
+        up.engines.Engine,
+        up.engines.mixins.SequentialSimulatorMixin
+    ):
+    """
+    Sequential simulator for the problems supported by Tamer.
+
+    The conditions and the effects of the actions are compiled once into
+    python functions working on tuples of values, so that checking and
+    applying an action does not walk and simplify the expressions every time.
+    Besides the `SequentialSimulatorMixin` interface, `successors` and
+    `rollouts` compute in a single call all the successors of a state and
+    many random trajectories, possibly in parallel processes.
+    """
+
+    def __init__(self, problem: 'up.model.Problem', error_on_failed_checks: bool = True, **options):
+        up.engines.Engine.__init__(self)
+        up.engines.mixins.SequentialSimulatorMixin.__init__(self, problem, error_on_failed_checks)
+        if len(options) > 0:
+            raise up.exceptions.UPUsageError('Custom options not supported!')
+        self._em = problem.environment.expression_manager
+        self._index: Dict[Tuple['up.model.Fluent', Tuple[Any, ...]], int] = {}
+        self._to_fnode: List[Callable[[Any], FNode]] = []
+        self._bounds: List[Tuple[Any, Any]] = []
+        self._is_bool: List[bool] = []
+        initial_values = []
+        for k, v in problem.initial_values.items():
+            self._index[(k.fluent(), tuple(self._constant_value(a) for a in k.args))] = len(initial_values)
+            initial_values.append(self._constant_value(v))
+            self._to_fnode.append(self._fnode_maker(k.type))
+            self._bounds.append(self._type_bounds(k.type))
+            self._is_bool.append(k.type.is_bool_type())
+        self._initial_values: Values = tuple(initial_values)
+        self._actions: Dict['up.model.Action', _CompiledAction] = {}
+        for a in problem.actions:
+            self._actions[a] = self._compile_action(a)
+        self._goals = [self._compile(g, {}) for g in problem.goals]
+        self._grounded_actions: Optional[List[Tuple['up.model.Action', Tuple[FNode, ...], Tuple[Any, ...]]]] = None
+
+    @property
+    def name(self) -> str:
+        return 'Tamer'
+
+    @staticmethod
+    def supported_kind() -> ProblemKind:
+        supported_kind = ProblemKind(version=2)
+        supported_kind.set_problem_class('ACTION_BASED')
+        supported_kind.set_numbers("BOUNDED_TYPES")
+        supported_kind.set_problem_type("SIMPLE_NUMERIC_PLANNING")
+        supported_kind.set_problem_type("GENERAL_NUMERIC_PLANNING")
+        supported_kind.set_typing('FLAT_TYPING')
+        supported_kind.set_parameters("BOOL_FLUENT_PARAMETERS")
+        supported_kind.set_parameters("BOUNDED_INT_FLUENT_PARAMETERS")
+        supported_kind.set_parameters("BOOL_ACTION_PARAMETERS")
+        supported_kind.set_parameters("BOUNDED_INT_ACTION_PARAMETERS")
+        supported_kind.set_effects_kind('CONDITIONAL_EFFECTS')
+        supported_kind.set_effects_kind('INCREASE_EFFECTS')
+        supported_kind.set_effects_kind('DECREASE_EFFECTS')
+        supported_kind.set_effects_kind("STATIC_FLUENTS_IN_BOOLEAN_ASSIGNMENTS")
+        supported_kind.set_effects_kind("STATIC_FLUENTS_IN_NUMERIC_ASSIGNMENTS")
+        supported_kind.set_effects_kind("STATIC_FLUENTS_IN_OBJECT_ASSIGNMENTS")
+        supported_kind.set_effects_kind("FLUENTS_IN_BOOLEAN_ASSIGNMENTS")
+        supported_kind.set_effects_kind("FLUENTS_IN_NUMERIC_ASSIGNMENTS")
+        supported_kind.set_effects_kind("FLUENTS_IN_OBJECT_ASSIGNMENTS")
+        supported_kind.set_conditions_kind('NEGATIVE_CONDITIONS')
+        supported_kind.set_conditions_kind('DISJUNCTIVE_CONDITIONS')
+        supported_kind.set_conditions_kind('EQUALITIES')
+        supported_kind.set_fluents_type("INT_FLUENTS")
+        supported_kind.set_fluents_type("REAL_FLUENTS")
+        supported_kind.set_fluents_type('OBJECT_FLUENTS')
+        supported_kind.set_simulated_entities('SIMULATED_EFFECTS')
+        return supported_kind
+
+    @staticmethod
+    def supports(problem_kind: 'up.model.ProblemKind') -> bool:
+        return problem_kind <= SequentialSimulator.supported_kind()
+
+    @staticmethod
+    def get_credits(**kwargs) -> Optional[up.engines.Credits]:
+        return credits
+
+    def _constant_value(self, e: FNode) -> Any:
+        if e.is_object_exp():
+            return e.object()
+        elif e.is_real_constant():
+            return Fraction(e.constant_value())
+        elif e.is_bool_constant() or e.is_int_constant():
+            return e.constant_value()
+        else:
+            raise NotImplementedError
+
+    def _fnode_maker(self, typename: 'up.model.Type') -> Callable[[Any], FNode]:
+        if typename.is_bool_type():
+            return self._em.Bool
+        elif typename.is_int_type():
+            return self._em.Int
+        elif typename.is_real_type():
+            return lambda v: self._em.Real(Fraction(v))
+        elif typename.is_user_type():
+            return self._em.ObjectExp
+        raise NotImplementedError
+
+    def _type_bounds(self, typename: 'up.model.Type') -> Tuple[Any, Any]:
+        if typename.is_int_type() or typename.is_real_type():
+            return typename.lower_bound, typename.upper_bound # type: ignore
+        return None, None
+
+    def _parameter_domain(self, typename: 'up.model.Type') -> List[Any]:
+        if typename.is_user_type():
+            return list(self._problem.objects(typename)) # type: ignore
+        elif typename.is_bool_type():
+            return [False, True]
+        elif typename.is_int_type() and typename.lower_bound is not None and typename.upper_bound is not None: # type: ignore
+            return list(range(typename.lower_bound, typename.upper_bound + 1)) # type: ignore
+        raise up.exceptions.UPUsageError(f'Parameters of type {typename} can not be grounded!')
+
+    def _compile(self, e: FNode, params: Dict['up.model.Parameter', int]) -> Evaluator:
+        """Returns a function computing the value of the expression from the state values and the action arguments."""
+        if e.is_bool_constant() or e.is_int_constant() or e.is_real_constant() or e.is_object_exp():
+            c = self._constant_value(e)
+            return lambda v, a: c
+        elif e.is_parameter_exp():
+            i = params[e.parameter()]
+            return lambda v, a: a[i]
+        elif e.is_fluent_exp():
+            fluent = e.fluent()
+            index = self._index
+            if all(x.is_constant() for x in e.args):
+                j = index[(fluent, tuple(self._constant_value(x) for x in e.args))]
+                return lambda v, a: v[j]
+            if all(x.is_parameter_exp() for x in e.args):
+                pos = tuple(params[x.parameter()] for x in e.args)
+                return lambda v, a: v[index[(fluent, tuple(a[i] for i in pos))]]
+            args = [self._compile(x, params) for x in e.args]
+            return lambda v, a: v[index[(fluent, tuple(f(v, a) for f in args))]]
+        args = [self._compile(x, params) for x in e.args]
+        if e.is_and():
+            return lambda v, a: all(f(v, a) for f in args)
+        elif e.is_or():
+            return lambda v, a: any(f(v, a) for f in args)
+        elif e.is_not():
+            f = args[0]
+            return lambda v, a: not f(v, a)
+        elif e.is_implies():
+            l, r = args
+            return lambda v, a: (not l(v, a)) or r(v, a)
+        elif e.is_iff() or e.is_equals():
+            l, r = args
+            return lambda v, a: l(v, a) == r(v, a)
+        elif e.is_le():
+            l, r = args
+            return lambda v, a: l(v, a) <= r(v, a)
+        elif e.is_lt():
+            l, r = args
+            return lambda v, a: l(v, a) < r(v, a)
+        elif e.is_plus():
+            return lambda v, a: sum(f(v, a) for f in args)
+        elif e.is_minus():
+            l, r = args
+            return lambda v, a: l(v, a) - r(v, a)
+        elif e.is_times():
+            def times(v, a):
+                res = 1
+                for f in args:
+                    res *= f(v, a)
+                return res
+            return times
+        elif e.is_div():
+            l, r = args
+            return lambda v, a: Fraction(l(v, a)) / r(v, a)
+        raise NotImplementedError
+
+    def _compile_fluent(self, e: FNode, params: Dict['up.model.Parameter', int]) -> Evaluator:
+        """Returns a function computing the index of the given fluent expression."""
+        fluent = e.fluent()
+        index = self._index
+        if all(x.is_constant() for x in e.args):
+            j = index[(fluent, tuple(self._constant_value(x) for x in e.args))]
+            return lambda v, a: j
+        args = [self._compile(x, params) for x in e.args]
+        return lambda v, a: index[(fluent, tuple(f(v, a) for f in args))]
+
+    def _compile_action(self, action: 'up.model.Action') -> _CompiledAction:
+        if not isinstance(action, up.model.InstantaneousAction):
+            raise up.exceptions.UPUsageError(f'{self.name} can only simulate instantaneous actions!')
+        params = {p: i for i, p in enumerate(action.parameters)}
+        preconditions = [self._compile(c, params) for c in action.preconditions]
+        effects = []
+        for e in action.effects:
+            if e.is_forall():
+                raise NotImplementedError
+            kind = 'assign' if e.is_assignment() else ('increase' if e.is_increase() else 'decrease')
+            condition = self._compile(e.condition, params) if e.is_conditional() else None
+            effects.append((self._compile_fluent(e.fluent, params), self._compile(e.value, params), condition, kind))
+        se = action.simulated_effect
+        simulated_effect = None
+        if se is not None:
+            simulated_effect = ([self._compile_fluent(f, params) for f in se.fluents], se)
+        return _CompiledAction(preconditions, effects, simulated_effect)
+
+    def _successor(self, values: Values, action: 'up.model.Action',
+                   args: Tuple[Any, ...], parameters: Tuple[FNode, ...]) -> Optional[Values]:
+        """Returns the values after applying the action, or None if it is not applicable."""
+        ca = self._actions[action]
+        for c in ca.preconditions:
+            if not c(values, args):
+                return None
+        updates: Dict[int, Any] = {}
+        assigned = set()
+        for fluent, value, condition, kind in ca.effects:
+            if condition is not None and not condition(values, args):
+                continue
+            i = fluent(values, args)
+            new_value = value(values, args)
+            if kind == 'assign':
+                if i in updates and updates[i] != new_value:
+                    if not self._is_bool[i]:
+                        return None
+                    # add-after-delete
+                    new_value = True
+                elif i in updates and i not in assigned:
+                    return None
+                updates[i] = new_value
+                assigned.add(i)
+            else:
+                if i in assigned:
+                    return None
+                old_value = updates.get(i, values[i])
+                updates[i] = old_value + new_value if kind == 'increase' else old_value - new_value
+        if ca.simulated_effect is not None:
+            fluents, se = ca.simulated_effect
+            state = SimulatorState(values, self)
+            res = se.function(self._problem, state, dict(zip(action.parameters, parameters)))
+            for f, r in zip(fluents, res):
+                updates[f(values, args)] = self._constant_value(r)
+        new_values = list(values)
+        for i, new_value in updates.items():
+            lb, ub = self._bounds[i]
+            if (lb is not None and new_value < lb) or (ub is not None and new_value > ub):
+                return None
+            new_values[i] = new_value
+        return tuple(new_values)
+
+    def _grounding(self) -> List[Tuple['up.model.Action', Tuple[FNode, ...], Tuple[Any, ...]]]:
+        if self._grounded_actions is None:
+            self._grounded_actions = []
+            for a in self._problem.actions: # type: ignore
+                domains = [self._parameter_domain(p.type) for p in a.parameters]
+                for args in product(*domains):
+                    parameters = tuple(self._em.auto_promote(list(args)))
+                    self._grounded_actions.append((a, parameters, args))
+        return self._grounded_actions
+
+    def _get_initial_state(self) -> 'up.model.State':
+        return SimulatorState(self._initial_values, self)
+
+    def _is_applicable(self, state: 'up.model.State', action: 'up.model.Action',
+                       parameters: Tuple[FNode, ...]) -> bool:
+        return self._apply(state, action, parameters) is not None
+
+    def _apply(self, state: 'up.model.State', action: 'up.model.Action',
+               parameters: Tuple[FNode, ...]) -> Optional['up.model.State']:
+        assert isinstance(state, SimulatorState)
+        args = tuple(self._constant_value(p) for p in parameters)
+        values = self._successor(state._values, action, args, parameters)
+        return None if values is None else SimulatorState(values, self)
+
+    def _get_applicable_actions(self, state: 'up.model.State') -> Iterator[Tuple['up.model.Action', Tuple[FNode, ...]]]:
+        for a, parameters, _ in self.successors(state):
+            yield a, parameters
+
+    def _is_goal(self, state: 'up.model.State') -> bool:
+        assert isinstance(state, SimulatorState)
+        return all(g(state._values, ()) for g in self._goals)
+
+    def successors(self, state: 'up.model.State') -> List[Tuple['up.model.Action', Tuple[FNode, ...], SimulatorState]]:
+        """Returns all the applicable actions in the given state, together with the reached states."""
+        assert isinstance(state, SimulatorState)
+        res = []
+        for a, parameters, args in self._grounding():
+            values = self._successor(state._values, a, args, parameters)
+            if values is not None:
+                res.append((a, parameters, SimulatorState(values, self)))
+        return res
+
+    def _rollout(self, seed: int, horizon: int,
+                 policy: Optional[Callable[[SimulatorState, List[Tuple['up.model.Action', Tuple[FNode, ...], SimulatorState]]], int]]) -> Tuple[List[int], bool]:
+        rng = random.Random(seed)
+        grounding = self._grounding()
+        values = self._initial_values
+        steps: List[int] = []
+        state = SimulatorState(values, self)
+        while len(steps) < horizon and not self._is_goal(state):
+            successors = []
+            for j, (a, parameters, args) in enumerate(grounding):
+                new_values = self._successor(values, a, args, parameters)
+                if new_values is not None:
+                    successors.append((j, new_values))
+            if len(successors) == 0:
+                break
+            if policy is None:
+                j, values = successors[rng.randrange(len(successors))]
+            else:
+                choices = [(grounding[k][0], grounding[k][1], SimulatorState(v, self)) for k, v in successors]
+                j, values = successors[policy(state, choices)]
+            steps.append(j)
+            state = SimulatorState(values, self)
+        return steps, self._is_goal(state)
+
+    def rollouts(self, count: int, horizon: int, seed: Optional[int] = None,
+                 processes: Optional[int] = None,
+                 policy: Optional[Callable[[SimulatorState, List[Tuple['up.model.Action', Tuple[FNode, ...], SimulatorState]]], int]] = None) -> List[Rollout]:
+        """
+        Simulates `count` trajectories of at most `horizon` steps from the
+        initial state, stopping early in goal states and dead ends.
+
+        At every step the `policy` receives the current state and its
+        successors and returns the index of the chosen one; by default the
+        successor is chosen at random. With `processes` the trajectories are
+        split among that many forked processes.
+        """
+        global _ROLLOUT_SIMULATOR, _ROLLOUT_POLICY
+        rng = random.Random(seed)
+        seeds = [rng.getrandbits(64) for _ in range(count)]
+        if processes is not None and processes > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            warnings.warn('Parallel rollouts need the fork start method, running them sequentially.', UserWarning)
+            processes = None
+        if processes is None or processes <= 1:
+            results = [self._rollout(s, horizon, policy) for s in seeds]
+        else:
+            self._grounding()
+            chunks = [(seeds[i::processes], horizon) for i in range(processes)]
+            _ROLLOUT_SIMULATOR = self
+            _ROLLOUT_POLICY = policy
+            try:
+                with multiprocessing.get_context('fork').Pool(processes) as pool:
+                    parts = pool.map(_rollouts_chunk, chunks)
+            finally:
+                _ROLLOUT_SIMULATOR = None
+                _ROLLOUT_POLICY = None
+            results = [None] * count # type: ignore
+            for i, part in enumerate(parts):
+                results[i::processes] = part
+        grounding = self._grounding()
+        res = []
+        for steps, goal in results:
+            values = self._initial_values
+            actions = []
+            for j in steps:
+                a, parameters, args = grounding[j]
+                values = self._successor(values, a, args, parameters) # type: ignore
+                actions.append(up.plans.ActionInstance(a, parameters))
+            res.append(Rollout(actions, SimulatorState(values, self), goal))
+        return res
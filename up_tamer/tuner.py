@@ -0,0 +1,234 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Tuning of the Tamer engine parameters on a set of representative problems.
+
+The configurations are sampled from `EngineImpl.get_configuration_space()`
+and raced over the problems: each run solves one problem with one
+configuration in its own process with a timeout, the runs are scheduled as
+soon as a worker is free, and the configurations that are clearly worse than
+another one on the problems they both solved are dropped as the results
+arrive.
+A run is scored with its solving time, or with 10 times the timeout if no
+plan is found (PAR10).
+
+The problems are read from a directory: every `.anml` file is a problem,
+every `.pddl` file is a problem of the `domain.pddl` file in the same
+directory. The tuner can be used from the command line:
+
+    python -m up_tamer.tuner problems/ --workers 8 --timeout 60
+
+and the best configuration can be given to the engine as
+`EngineImpl(**best)`.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Set, Tuple
+
+import unified_planning as up
+import unified_planning.io
+from unified_planning.engines import PlanGenerationResultStatus
+from up_tamer.engine import EngineImpl, DEFAULT_WEIGHT
+
+
+PAR_FACTOR = 10
+
+
+def find_problems(path: str) -> List[Tuple[Optional[str], str]]:
+    """Returns the (domain, problem) files of the problems in the given directory."""
+    res: List[Tuple[Optional[str], str]] = []
+    for root, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            if name.endswith('.anml'):
+                res.append((None, os.path.join(root, name)))
+            elif name.endswith('.pddl') and name != 'domain.pddl':
+                domain = os.path.join(root, 'domain.pddl')
+                if os.path.exists(domain):
+                    res.append((domain, os.path.join(root, name)))
+    return res
+
+
+def _read_problem(domain: Optional[str], problem: str) -> 'up.model.Problem':
+    if domain is None:
+        return up.io.ANMLReader().parse_problem(problem)
+    return up.io.PDDLReader().parse_problem(domain, problem)
+
+
+def _run(conn, domain: Optional[str], problem_file: str, config: Dict[str, object]):
+    try:
+        problem = _read_problem(domain, problem_file)
+        engine = EngineImpl(**config)
+        engine.error_on_failed_checks = False
+        conn.send('started')
+        start = time.time()
+        result = engine.solve(problem)
+        solving_time = time.time() - start
+        solved = result.status in (PlanGenerationResultStatus.SOLVED_SATISFICING,
+                                   PlanGenerationResultStatus.SOLVED_OPTIMALLY)
+        conn.send((solved, solving_time))
+    except Exception:
+        conn.send((False, None))
+    finally:
+        conn.close()
+
+
+def run_configuration(domain: Optional[str], problem: str, config: Dict[str, object],
+                      timeout: float) -> Tuple[bool, float]:
+    """
+    Solves the problem with the given configuration in a new process and
+    returns whether a plan was found and the score of the run.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_run, args=(child_conn, domain, problem, config))
+    process.start()
+    child_conn.close()
+    solved, score = False, float(PAR_FACTOR * timeout)
+    try:
+        if parent_conn.poll(timeout) and parent_conn.recv() == 'started' and parent_conn.poll(timeout):
+            ok, solving_time = parent_conn.recv()
+            if ok and solving_time <= timeout:
+                solved, score = True, solving_time
+    except EOFError:
+        pass
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        parent_conn.close()
+    return solved, score
+
+
+def _survivors(alive: Set[int], scores: List[Dict[int, float]],
+               race_factor: float, min_problems: int) -> Set[int]:
+    """
+    Returns the configurations that are not beaten by another one: a
+    configuration is beaten if, on at least `min_problems` problems run by
+    both, its total score is more than `race_factor` times the other one.
+    """
+    res = set(alive)
+    for i in sorted(alive):
+        for j in sorted(alive):
+            if i == j or j not in res:
+                continue
+            common = scores[i].keys() & scores[j].keys()
+            if len(common) >= min_problems and \
+               sum(scores[i][n] for n in common) > race_factor * sum(scores[j][n] for n in common):
+                res.discard(i)
+                break
+    return res
+
+
+def tune(path: str, configurations: int = 20, workers: Optional[int] = None,
+         timeout: float = 60.0, seed: int = 0, race_factor: float = 2.0,
+         min_problems: int = 2) -> Tuple[Dict[str, object], List[Dict[str, object]]]:
+    """
+    Races `configurations` configurations of the Tamer engine over the
+    problems in `path`, running at most `workers` runs in parallel.
+
+    The runs are scheduled as workers become free, always advancing the
+    configurations that ran on the fewest problems, so that when only a few
+    configurations are left they run on several problems at once. As soon
+    as a result arrives, a configuration is dropped if its total score is
+    more than `race_factor` times the one of another configuration, on at
+    least `min_problems` problems run by both.
+
+    Returns the best configuration and a table with, for every
+    configuration, the number of solved problems, the number of runs, the
+    mean score and whether it was dropped; the table is sorted from the best
+    configuration.
+    """
+    problems = find_problems(path)
+    if len(problems) == 0:
+        raise up.exceptions.UPUsageError(f'No problems found in {path}!')
+    random.Random(seed).shuffle(problems)
+    space = EngineImpl.get_configuration_space()
+    space.seed(seed)
+    candidates: List[Dict[str, object]] = [{'weight': DEFAULT_WEIGHT, 'heuristic': 'hadd'}]
+    if configurations > 1:
+        sampled = space.sample_configuration(configurations - 1)
+        if configurations == 2:
+            sampled = [sampled]
+        for c in sampled:
+            candidates.append({k: (str(v) if isinstance(v, str) else float(v)) for k, v in dict(c).items()})
+    scores: List[Dict[int, float]] = [{} for _ in candidates]
+    solved = [0 for _ in candidates]
+    next_problem = [0 for _ in candidates]
+    alive = set(range(len(candidates)))
+    max_runs = workers or os.cpu_count() or 1
+    running: Dict[Future, Tuple[int, int]] = {}
+    with ThreadPoolExecutor(max_workers=max_runs) as executor:
+        while True:
+            while len(running) < max_runs:
+                waiting = [i for i in alive if next_problem[i] < len(problems)]
+                if len(waiting) == 0:
+                    break
+                i = min(waiting, key=lambda i: (next_problem[i], i))
+                n = next_problem[i]
+                next_problem[i] += 1
+                domain, problem = problems[n]
+                f = executor.submit(run_configuration, domain, problem, candidates[i], timeout)
+                running[f] = (i, n)
+            if len(running) == 0:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                i, n = running.pop(f)
+                ok, score = f.result()
+                scores[i][n] = score
+                solved[i] += int(ok)
+            alive = _survivors(alive, scores, race_factor, min_problems)
+    table = []
+    for i, c in enumerate(candidates):
+        runs = len(scores[i])
+        table.append({'configuration': c, 'solved': solved[i], 'runs': runs,
+                      'mean_score': sum(scores[i].values()) / runs if runs > 0 else float('inf'),
+                      'dropped': i not in alive})
+    table.sort(key=lambda r: (r['dropped'], -r['runs'], -r['solved'], r['mean_score']))
+    return table[0]['configuration'], table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tunes the Tamer engine on a set of problems.')
+    parser.add_argument('path', help='directory containing the problems')
+    parser.add_argument('--configurations', type=int, default=20, help='number of configurations to race')
+    parser.add_argument('--workers', type=int, default=None, help='number of parallel runs')
+    parser.add_argument('--timeout', type=float, default=60.0, help='timeout of each run in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--race-factor', type=float, default=2.0,
+                        help='configurations whose total score is worse than this factor times another one are dropped')
+    parser.add_argument('--min-problems', type=int, default=2,
+                        help='number of problems run by two configurations before comparing them')
+    parser.add_argument('--output', default=None, help='file where the best configuration is written as JSON')
+    args = parser.parse_args()
+    best, table = tune(args.path, args.configurations, args.workers, args.timeout,
+                       args.seed, args.race_factor, args.min_problems)
+    print(f"{'weight':>8} {'heuristic':>10} {'solved':>7} {'runs':>5} {'mean score':>11} {'dropped':>8}")
+    for row in table:
+        c = row['configuration']
+        print(f"{c['weight']:8.3f} {c['heuristic']:>10} {row['solved']:7d} {row['runs']:5d} {row['mean_score']:11.3f} {str(row['dropped']):>8}")
+    print(json.dumps(best))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(best, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+# Copyright 2021 AIPlan4EU project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Long-running Tamer workers answering solve and validate requests over a
+local Unix socket.
+
+The workers keep the interpreter, pytamer and the engines warm, so that
+small problems do not pay the start-up cost at every call. The parsed
+problems are cached, but the conversion to Tamer is repeated at every
+request, as the engine itself does not cache it. Problems and
+plans are exchanged with the protobuf serialization of unified_planning
+(it requires the `protobuf` package, installed by `unified-planning[grpc]`).
+
+A daemon is started with:
+
+    python -m up_tamer.worker --socket /tmp/up_tamer.sock --workers 4
+
+and used through :class:`up_tamer.client.EngineClient`.
+
+Every message is made of a one byte kind, a four bytes big-endian length
+and the serialized payload. The engine options of a plan request are part
+of the `PlanRequest` message; a validation request carries them in a JSON
+header before the `ValidationRequest` message (see `pack_options`).
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import unified_planning as up
+import unified_planning.engines
+import unified_planning.grpc.generated.unified_planning_pb2 as proto
+from unified_planning.grpc.proto_reader import ProtobufReader
+from unified_planning.grpc.proto_writer import ProtobufWriter
+from up_tamer.engine import EngineImpl
+
+
+PLAN_REQUEST = b'P'
+VALIDATION_REQUEST = b'V'
+PLAN_RESULT = b'R'
+VALIDATION_RESULT = b'A'
+ERROR = b'E'
+
+_HEADER = struct.Struct('!cI')
+_LENGTH = struct.Struct('!I')
+
+
+def send_message(sock: socket.socket, kind: bytes, payload: bytes):
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if len(chunk) == 0:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock: socket.socket) -> Optional[Tuple[bytes, bytes]]:
+    """Returns the kind and the payload of the next message, or None if the connection is closed."""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    kind, size = _HEADER.unpack(header)
+    payload = _recv_exactly(sock, size)
+    if payload is None:
+        return None
+    return kind, payload
+
+
+def pack_options(options: Dict[str, str], payload: bytes) -> bytes:
+    """Prefixes the payload with the given options, encoded as JSON."""
+    header = json.dumps(options, sort_keys=True).encode()
+    return _LENGTH.pack(len(header)) + header + payload
+
+
+def unpack_options(data: bytes) -> Tuple[Dict[str, str], bytes]:
+    """Returns the options and the payload packed with `pack_options`."""
+    size, = _LENGTH.unpack_from(data)
+    start = _LENGTH.size
+    return json.loads(data[start:start + size].decode()), data[start + size:]
+
+
+def parse_engine_options(options: Dict[str, str]) -> Dict[str, object]:
+    """Converts the string options of a request into the `EngineImpl` parameters."""
+    res: Dict[str, object] = {}
+    for k, v in options.items():
+        if k == 'weight':
+            res[k] = float(v)
+        elif k in ('weak_equality', 'pruning'):
+            res[k] = v.lower() in ('1', 'true', 'yes')
+        else:
+            res[k] = v
+    return res
+
+
+class Worker:
+    """
+    Serves the requests of the connections accepted on a listening socket,
+    keeping an engine for each set of options and the last parsed problems;
+    the converted Tamer problems are not cached.
+    """
+    def __init__(self, cache_size: int = 16):
+        self._reader = ProtobufReader()
+        self._writer = ProtobufWriter()
+        self._engines: Dict[Tuple[Tuple[str, str], ...], EngineImpl] = {}
+        self._engine({})
+        self._problems: 'OrderedDict[bytes, up.model.Problem]' = OrderedDict()
+        self._cache_size = cache_size
+
+    def _engine(self, options: Dict[str, str]) -> EngineImpl:
+        key = tuple(sorted(options.items()))
+        if key not in self._engines:
+            engine = EngineImpl(**parse_engine_options(options))
+            # The client already checked the problem kind.
+            engine.skip_checks = True
+            self._engines[key] = engine
+        return self._engines[key]
+
+    def _problem(self, msg: 'proto.Problem') -> 'up.model.Problem':
+        key = hashlib.sha1(msg.SerializeToString(deterministic=True)).digest()
+        problem = self._problems.get(key, None)
+        if problem is None:
+            problem = self._reader.convert(msg)
+            self._problems[key] = problem
+            if len(self._problems) > self._cache_size:
+                self._problems.popitem(last=False)
+        else:
+            self._problems.move_to_end(key)
+        return problem
+
+    def _convert_plan_generation_result(self, result: 'up.engines.PlanGenerationResult') -> 'proto.PlanGenerationResult':
+        if result.plan is not None:
+            return self._writer.convert(result)
+        return proto.PlanGenerationResult(status=self._writer.convert(result.status),
+                                          engine=proto.Engine(name=result.engine_name),
+                                          metrics=result.metrics)
+
+    def handle(self, kind: bytes, payload: bytes) -> Tuple[bytes, bytes]:
+        """Returns the kind and the payload of the answer to the given request."""
+        try:
+            if kind == PLAN_REQUEST:
+                request = proto.PlanRequest()
+                request.ParseFromString(payload)
+                problem = self._problem(request.problem)
+                timeout = request.timeout if request.timeout > 0 else None
+                result = self._engine(dict(request.engine_options)).solve(problem, timeout=timeout)
+                return PLAN_RESULT, self._convert_plan_generation_result(result).SerializeToString()
+            elif kind == VALIDATION_REQUEST:
+                options, payload = unpack_options(payload)
+                request = proto.ValidationRequest()
+                request.ParseFromString(payload)
+                problem = self._problem(request.problem)
+                plan = self._reader.convert(request.plan, problem)
+                result = self._engine(options).validate(problem, plan)
+                return VALIDATION_RESULT, self._writer.convert(result).SerializeToString()
+            else:
+                return ERROR, f'Unknown request kind {kind!r}'.encode()
+        except Exception:
+            return ERROR, traceback.format_exc().encode()
+
+    def serve(self, server: socket.socket):
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    while True:
+                        msg = recv_message(conn)
+                        if msg is None:
+                            break
+                        send_message(conn, *self.handle(*msg))
+                except OSError:
+                    # The client went away, possibly while its request was running.
+                    pass
+
+
+def _run_worker(server: socket.socket, cache_size: int):
+    Worker(cache_size).serve(server)
+
+
+def serve(socket_path: str, workers: int = 1, cache_size: int = 16):
+    """
+    Listens on the given Unix socket and serves the requests with `workers`
+    processes; the processes share the listening socket, so every new
+    connection is accepted by an idle worker.
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(max(16, 4 * workers))
+    try:
+        if workers <= 1:
+            _run_worker(server, cache_size)
+        else:
+            ctx = multiprocessing.get_context('fork')
+            processes = [ctx.Process(target=_run_worker, args=(server, cache_size), daemon=True)
+                         for _ in range(workers)]
+            for p in processes:
+                p.start()
+            for p in processes:
+                p.join()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tamer worker daemon for unified_planning.')
+    parser.add_argument('--socket', required=True, help='path of the Unix socket to listen on')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--cache-size', type=int, default=16,
+                        help='number of parsed problems kept by each worker')
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        serve(args.socket, args.workers, args.cache_size)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()